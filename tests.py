@@ -1,4 +1,8 @@
-from uhttp import Application, MultiDict, Response
+import copy
+import pickle
+import threading
+
+from uhttp import Application, MultiDict, Response, nonblocking
 
 
 class TestApplication(Application):
@@ -17,7 +21,7 @@ class TestApplication(Application):
         }
 
         async def http_receive():
-            return {'body': body, 'more_body': False}
+            return {'type': 'http.request', 'body': body, 'more_body': False}
 
         async def http_send(event):
             if event['type'] == 'http.response.start':
@@ -25,8 +29,9 @@ class TestApplication(Application):
                 response['headers'] = MultiDict([
                     [k.decode(), v.decode()] for k, v in event['headers']
                 ])
+                response['body'] = b''
             elif event['type'] == 'http.response.body':
-                response['body'] = event['body']
+                response['body'] += event['body']
 
         lifespan_scope = {'type': 'lifespan', 'state': state}
 
@@ -109,6 +114,24 @@ async def test_lifespan_shutdown():
     assert msgs[-1] == 'BYE!'
 
 
+async def test_request_state():
+    app = TestApplication()
+    state = {}
+
+    @app.startup
+    def startup(lifespan_state):
+        lifespan_state['msg'] = 'HI!'
+        state.update(lifespan=lifespan_state)
+
+    @app.get('/')
+    def index(request):
+        request.state['msg'] = 'BYE!'
+        request.state['user'] = 'john'
+
+    await app.test('GET', '/')
+    assert state['lifespan'] == {'msg': 'HI!'}
+
+
 async def test_204():
     app = TestApplication()
 
@@ -121,6 +144,22 @@ async def test_204():
     assert response['body'] == b''
 
 
+async def test_response_str():
+    response = Response(404)
+    assert str(response) == '404 Not Found'
+
+
+async def test_response_copy():
+    response = copy.copy(Response(404, headers={'x-a': '1'}, body=b'gone'))
+    assert response.status == 404
+    assert response.headers['x-a'] == '1'
+    assert response.body == b'gone'
+    assert copy.copy(Response.from_any(404)).status == 404
+    response = pickle.loads(pickle.dumps(Response(status=302)))
+    assert response.status == 302
+    assert str(response) == '302 Found'
+
+
 async def test_404():
     app = TestApplication()
     response = await app.test('GET', '/')
@@ -147,6 +186,56 @@ async def test_413():
     assert response['status'] == 413
 
 
+async def test_413_content_length():
+    app = TestApplication()
+    response = await app.test(
+        'POST',
+        '/',
+        headers=[[b'content-length', str(app._max_content + 1).encode()]]
+    )
+    assert response['status'] == 413
+
+
+async def test_400_content_length():
+    app = TestApplication()
+    response = await app.test(
+        'POST', '/', headers=[[b'content-length', b'abc']]
+    )
+    assert response['status'] == 400
+
+
+async def test_disconnect():
+    app = TestApplication()
+    called = []
+    sent = []
+    events = [
+        {'type': 'http.request', 'body': b'name=jo', 'more_body': True},
+        {'type': 'http.disconnect'}
+    ]
+
+    @app.post('/')
+    def submit(request):
+        called.append(request)
+
+    async def receive():
+        return events.pop(0)
+
+    async def send(event):
+        sent.append(event)
+
+    await app({
+        'type': 'http',
+        'method': 'POST',
+        'path': '/',
+        'query_string': b'',
+        'headers': [
+            [b'content-type', b'application/x-www-form-urlencoded']
+        ]
+    }, receive, send)
+    assert called == []
+    assert sent == []
+
+
 async def test_methods():
     app = TestApplication()
     methods = ('GET', 'HEAD', 'POST', 'PUT', 'DELETE', 'OPTIONS')
@@ -172,6 +261,89 @@ async def test_path_parameters():
     assert response['body'] == b'Hello, john!'
 
 
+async def test_static_routes():
+    app = TestApplication()
+
+    @app.get(r'/(?P<page>\w+)')
+    def page(request):
+        return f'Page {request.params["page"]}'
+
+    @app.get('/about')
+    def about(request):
+        return 'About'
+
+    response = await app.test('GET', '/about')
+    assert response['body'] == b'About'
+    response = await app.test('GET', '/contact')
+    assert response['body'] == b'Page contact'
+    assert app._static_routes == {'/about': {'GET': about}}
+
+
+async def test_dynamic_routes_order():
+    app = TestApplication()
+
+    @app.get(r'/user/(?P<id>\d+)')
+    def user(request):
+        return f'User {request.params["id"]}'
+
+    @app.get(r'/(?P<section>\w+)/(?P<id>\d+)')
+    def section(request):
+        return f'{request.params["section"]} {request.params["id"]}'
+
+    @app.get(r'/user/(?P<name>\w+)')
+    def user_name(request):
+        return f'User {request.params["name"]}'
+
+    @app.get(r'/user/?')
+    def users(request):
+        return 'Users'
+
+    response = await app.test('GET', '/user/1')
+    assert response['body'] == b'User 1'
+    response = await app.test('GET', '/post/2')
+    assert response['body'] == b'post 2'
+    response = await app.test('GET', '/user/john')
+    assert response['body'] == b'User john'
+    response = await app.test('GET', '/user')
+    assert response['body'] == b'Users'
+    response = await app.test('GET', '/user/')
+    assert response['body'] == b'Users'
+
+
+async def test_uncombined_dynamic_routes():
+    app = TestApplication()
+
+    @app.get(r'/(?P<word>[a-z]+)(?P=word)')
+    def echo(request):
+        return request.params['word']
+
+    @app.get(r'/(?P<word>[a-z]+)')
+    def word(request):
+        return request.params['word'].upper()
+
+    response = await app.test('GET', '/byebye')
+    assert response['body'] == b'bye'
+    response = await app.test('GET', '/bye')
+    assert response['body'] == b'BYE'
+
+
+async def test_inline_flag_routes():
+    app = TestApplication()
+
+    @app.get(r'(?u)/x/(?P<id>\d+)')
+    def x(request):
+        return f'x {request.params["id"]}'
+
+    @app.get(r'/(?P<section>\w+)/(?P<id>\d+)')
+    def section(request):
+        return f'{request.params["section"]} {request.params["id"]}'
+
+    response = await app.test('GET', '/x/1')
+    assert response['body'] == b'x 1'
+    response = await app.test('GET', '/y/1')
+    assert response['body'] == b'y 1'
+
+
 async def test_query_args():
     app = TestApplication()
     args = {}
@@ -186,6 +358,18 @@ async def test_query_args():
     assert args == {'tag': ['music', 'rock'], 'type': ['book']}
 
 
+async def test_quoted_query_args():
+    app = TestApplication()
+    args = {}
+
+    @app.get('/')
+    def index(request):
+        args.update(request.args)
+
+    await app.test('GET', '/', query_string=b'q=rock%26roll&sum=1%2B1+2')
+    assert args == {'q': ['rock&roll'], 'sum': ['1+1 2']}
+
+
 async def test_headers():
     app = TestApplication()
     headers = {}
@@ -194,7 +378,7 @@ async def test_headers():
     def hello(request):
         headers.update(request.headers)
 
-    await app.test('GET', '/', headers=[[b'from', b'test@example.com']])
+    await app.test('GET', '/', headers=[[b'From', b'test@example.com']])
     assert headers == {'from': ['test@example.com']}
 
 
@@ -222,6 +406,21 @@ async def test_set_cookie():
     assert response['headers']._get('set-cookie') == ['id=2', 'name=jane']
 
 
+async def test_set_cookie_header():
+    app = TestApplication()
+
+    @app.get('/')
+    def index(request):
+        response = Response(status=204, cookies={'id': 2})
+        response.headers['set-cookie'] = 'name=jane'
+        response.headers['x-token'] = b'abc'
+        return response
+
+    response = await app.test('GET', '/')
+    assert response['headers']._get('set-cookie') == ['name=jane', 'id=2']
+    assert response['headers']['x-token'] == 'abc'
+
+
 async def test_bad_json():
     app = TestApplication()
 
@@ -251,6 +450,58 @@ async def test_good_json():
     assert json == {'some': 1}
 
 
+async def test_bad_json_encoding():
+    app = TestApplication()
+
+    response = await app.test(
+        'POST',
+        '/',
+        headers=[[b'content-type', b'application/json']],
+        body=b'{"some": "\xff"}'
+    )
+    assert response['status'] == 400
+
+
+async def test_empty_json():
+    app = TestApplication()
+
+    @app.post('/')
+    def index(request):
+        return str(request.json)
+
+    response = await app.test(
+        'POST', '/', headers=[[b'content-type', b'application/json']]
+    )
+    assert response['status'] == 200
+    assert response['body'] == b'None'
+
+
+async def test_str_response():
+    app = TestApplication()
+
+    @app.get('/')
+    def hello(request):
+        return 'Olá!'
+
+    response = await app.test('GET', '/')
+    assert response['status'] == 200
+    assert response['headers']['content-type'] == 'text/html; charset=utf-8'
+    assert response['headers']['content-length'] == '5'
+    assert response['body'] == 'Olá!'.encode()
+
+
+async def test_chunked_response():
+    app = TestApplication()
+
+    @app.get('/')
+    def chunks(request):
+        return Response(200, body=[b'Hello', b', ', b'world!'])
+
+    response = await app.test('GET', '/')
+    assert response['headers']['content-length'] == '13'
+    assert response['body'] == b'Hello, world!'
+
+
 async def test_json_response():
     app = TestApplication()
 
@@ -261,7 +512,7 @@ async def test_json_response():
     response = await app.test('GET', '/')
     assert response['status'] == 200
     assert response['headers']['content-type'] == 'application/json'
-    assert response['body'] == b'{"hello": "world"}'
+    assert response['body'] == b'{"hello":"world"}'
 
 
 async def test_form():
@@ -298,6 +549,53 @@ async def test_early_response():
     assert response['body'] == b"Hi! I'm early!"
 
 
+async def test_nonblocking():
+    app = TestApplication()
+    threads = []
+
+    @app.before
+    @nonblocking
+    def before(request):
+        threads.append(threading.current_thread())
+
+    @app.get('/')
+    def index(request):
+        threads.append(threading.current_thread())
+
+    await app.test('GET', '/')
+    assert threads[0] is threading.main_thread()
+    assert threads[1] is not threading.main_thread()
+
+
+async def test_nonblocking_method():
+    app = TestApplication()
+    threads = []
+
+    class Handler:
+        def index(self, request):
+            threads.append(threading.current_thread())
+            return 'OK'
+
+    app.get('/')(nonblocking(Handler().index))
+
+    response = await app.test('GET', '/')
+    assert response['body'] == b'OK'
+    assert threads == [threading.main_thread()]
+
+
+async def test_nonblocking_async_method():
+    app = TestApplication()
+
+    class Handler:
+        async def index(self, request):
+            return 'OK'
+
+    app.get('/')(nonblocking(Handler().index))
+
+    response = await app.test('GET', '/')
+    assert response['body'] == b'OK'
+
+
 async def test_late_early_response():
     app = TestApplication()
 
@@ -330,3 +628,19 @@ async def test_app_mount():
         '/': {'GET': app2_index},
         '/app1/': {'GET': app1_index}
     }
+
+
+def test_multidict_copy():
+    headers = MultiDict([['Accept', 'text/html'], ['accept', 'text/plain']])
+    clone = MultiDict(headers)
+    clone['accept'] = '*/*'
+    assert clone._get('accept') == ['text/html', 'text/plain', '*/*']
+    assert headers._get('accept') == ['text/html', 'text/plain']
+
+
+def test_multidict_update():
+    headers = MultiDict({'Accept': ['text/html', 'text/plain'], 'From': 'a'})
+    headers.update({'ACCEPT': '*/*'}, host='example.com')
+    assert headers._get('accept') == ['*/*']
+    assert headers._get('from') == ['a']
+    assert headers['host'] == 'example.com'
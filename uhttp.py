@@ -2,11 +2,42 @@
 
 import re
 import json
+from collections import ChainMap
 from http import HTTPStatus
 from http.cookies import SimpleCookie, CookieError
-from urllib.parse import parse_qs, unquote
+from urllib.parse import parse_qsl
 from asyncio import to_thread
 from inspect import iscoroutinefunction
+from functools import lru_cache, partial, wraps
+
+try:
+    import orjson
+
+    json_loads = orjson.loads
+    json_dumps = partial(orjson.dumps, option=orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    json_loads = json.loads
+
+    def json_dumps(obj):
+        return json.dumps(
+            obj, ensure_ascii=False, separators=(',', ':')
+        ).encode()
+
+STATUS_PHRASES = {status.value: status.phrase for status in HTTPStatus}
+
+STATUS_BODIES = {
+    status: phrase.encode() for status, phrase in STATUS_PHRASES.items()
+}
+
+MAX_INLINE_BODY = 65536
+
+REGEX_SYNTAX = '.^$*+?{}[]\\|()'
+
+GROUP_NAME = re.compile(r'(?<!\\)\(\?P<(\w+)>')
+
+GLOBAL_FLAGS = re.compile(r'\(\?[aiLmsux]+\)')
+
+BACKREFERENCE = re.compile(r'\(\?P=|\(\?\(|\\[1-9]')
 
 
 class Application:
@@ -20,19 +51,63 @@ class Application:
         after=None,
         max_content=1048576
     ):
-        self._routes = routes or {}
+        self._routes = {}
+        self._static_routes = {}
+        self._segment_routes = {}
+        self._dynamic_routes = []
+        self._matchers = {}
+        self._match = lru_cache(maxsize=1024)(self._match)
         self._startup = startup or []
         self._shutdown = shutdown or []
         self._before = before or []
         self._after = after or []
         self._max_content = max_content
+        for path, methods in (routes or {}).items():
+            self._add_route(path, methods)
+
+    def _add_route(self, path, methods):
+        if path not in self._routes:
+            self._routes[path] = {}
+            if not any(c in path for c in REGEX_SYNTAX):
+                self._static_routes[path] = self._routes[path]
+            elif segment := literal_segment(path):
+                self._segment_routes.setdefault(
+                    segment, self._dynamic_routes[:]
+                ).append((re.compile(path), self._routes[path]))
+            else:
+                route = (re.compile(path), self._routes[path])
+                self._dynamic_routes.append(route)
+                for routes in self._segment_routes.values():
+                    routes.append(route)
+        self._routes[path].update(methods)
+        self._matchers.clear()
+        self._match.cache_clear()
+
+    def _match(self, path):
+        segment, routes = None, self._dynamic_routes
+        if (end := path.find('/', 1)) != -1:
+            if path[1:end] in self._segment_routes:
+                segment = path[1:end]
+                routes = self._segment_routes[segment]
+        if (matchers := self._matchers.get(segment)) is None:
+            matchers = self._matchers[segment] = combine_routes(routes)
+        for pattern, methods, markers in matchers:
+            if matches := pattern.fullmatch(path):
+                if markers is None:
+                    return methods, tuple(matches.groupdict().items())
+                methods, groups = markers[matches.lastgroup]
+                return methods, tuple(
+                    (name, matches[alias]) for alias, name in groups
+                )
+        return None, ()
 
     def mount(self, app, prefix=''):
         self._startup += app._startup
         self._shutdown += app._shutdown
         self._before += app._before
         self._after += app._after
-        self._routes.update({prefix + k: v for k, v in app._routes.items()})
+        for path, methods in app._routes.items():
+            self._add_route(prefix + path, methods)
         self._max_content = max(self._max_content, app._max_content)
 
     def startup(self, func):
@@ -53,9 +128,7 @@ class Application:
 
     def route(self, path, methods=('GET',)):
         def decorator(func):
-            self._routes.setdefault(path, {}).update({
-                method: func for method in methods
-            })
+            self._add_route(path, {method: func for method in methods})
             return func
         return decorator
 
@@ -97,9 +170,6 @@ class Application:
                     try:
                         for func in self._startup:
                             await asyncfy(func, state)
-                        self._routes = {
-                            re.compile(k): v for k, v in self._routes.items()
-                        }
                     except Exception as e:
                         await send({
                             'type': 'lifespan.startup.failed',
@@ -126,60 +196,92 @@ class Application:
                 method=scope['method'],
                 path=scope['path'],
                 ip=scope.get('client', ('', 0))[0],
-                args=parse_qs(unquote(scope['query_string'])),
-                state=state.copy()
+                query_string=scope['query_string'],
+                state=ChainMap({}, state)
             )
 
             try:
-                try:
-                    request.headers = MultiDict([
-                        [k.decode(), v.decode()] for k, v in scope['headers']
-                    ])
-                except UnicodeDecodeError:
-                    raise Response(400)
+                request.headers = MultiDict([
+                    (k.decode('latin-1'), v.decode('latin-1'))
+                    for k, v in scope['headers']
+                ])
 
                 try:
-                    request.cookies.load(request.headers.get('cookie', ''))
-                except CookieError:
+                    content_length = int(
+                        request.headers.get('content-length', 0)
+                    )
+                except ValueError:
                     raise Response(400)
+                if content_length > self._max_content:
+                    raise Response(413)
 
+                body = bytearray()
                 while True:
                     event = await receive()
-                    request.body += event['body']
-                    if len(request.body) > self._max_content:
+                    if event['type'] == 'http.disconnect':
+                        return
+                    body.extend(event.get('body', b''))
+                    if len(body) > self._max_content:
                         raise Response(413)
-                    if not event['more_body']:
+                    if not event.get('more_body', False):
                         break
-
-                content_type = request.headers.get('content-type', '')
-                if 'application/json' in content_type:
-                    try:
-                        request.json = await to_thread(
-                            json.loads, request.body.decode()
-                        )
-                    except (UnicodeDecodeError, json.JSONDecodeError):
-                        raise Response(400)
-                elif 'application/x-www-form-urlencoded' in content_type:
-                    request.form = MultiDict(await to_thread(
-                        parse_qs, unquote(request.body)
-                    ))
+                request.body = bytes(body)
+
+                if request.body:
+                    content_type = request.headers.get('content-type', '')
+                    inline = len(request.body) < MAX_INLINE_BODY
+                    if content_type.startswith('application/json'):
+                        try:
+                            if inline:
+                                request.json = json_loads(request.body)
+                            else:
+                                request.json = await to_thread(
+                                    json_loads, request.body
+                                )
+                        except (UnicodeDecodeError, json.JSONDecodeError):
+                            raise Response(400)
+                    elif content_type.startswith(
+                        'application/x-www-form-urlencoded'
+                    ):
+                        form = request.body.decode(errors='replace')
+                        if inline:
+                            request.form = MultiDict(parse_qsl(form))
+                        else:
+                            request.form = MultiDict(
+                                await to_thread(parse_qsl, form)
+                            )
 
                 for func in self._before:
                     if ret := await asyncfy(func, request):
                         raise Response.from_any(ret)
 
-                for route, methods in self._routes.items():
-                    if matches := route.fullmatch(request.path):
-                        request.params = matches.groupdict()
-                        if func := methods.get(request.method):
-                            ret = await asyncfy(func, request)
-                            response = Response.from_any(ret)
-                        else:
-                            response = Response(405)
-                            response.headers['allow'] = ', '.join(methods)
-                        break
-                else:
+                methods = self._static_routes.get(request.path)
+                if methods is None:
+                    methods, params = self._match(request.path)
+                    request.params = params
+                if methods is None:
                     response = Response(404)
+                elif func := methods.get(request.method):
+                    ret = await asyncfy(func, request)
+                    if isinstance(ret, str) and not self._after:
+                        body = ret.encode()
+                        await send({
+                            'type': 'http.response.start',
+                            'status': 200,
+                            'headers': [
+                                (b'content-type', b'text/html; charset=utf-8'),
+                                (b'content-length', str(len(body)).encode())
+                            ]
+                        })
+                        await send({
+                            'type': 'http.response.body',
+                            'body': body
+                        })
+                        return
+                    response = Response.from_any(ret)
+                else:
+                    response = Response(405)
+                    response.headers['allow'] = ', '.join(methods)
 
             except Response as early_response:
                 response = early_response
@@ -191,25 +293,38 @@ class Application:
             except Response as early_response:
                 response = early_response
 
-            response.headers.setdefault('content-length', len(response.body))
-            response.headers._update({
-                'set-cookie': [
-                    header.split(': ', maxsplit=1)[1]
-                    for header in response.cookies.output().splitlines()
-                ]
-            })
+            if isinstance(response.body, (list, tuple)):
+                chunks = response.body or [b'']
+            else:
+                chunks = [response.body]
+
+            response.headers.setdefault(
+                'content-length', str(sum(map(len, chunks)))
+            )
+            headers = [
+                (k.encode(), v if isinstance(v, bytes) else str(v).encode())
+                for k, l in response.headers._items() for v in l
+            ]
+            if response._cookies:
+                headers.extend(
+                    (b'set-cookie', morsel.OutputString().encode())
+                    for morsel in response._cookies.values()
+                )
 
             await send({
                 'type': 'http.response.start',
                 'status': response.status,
-                'headers': [
-                    [str(k).encode(), str(v).encode()]
-                    for k, l in response.headers._items() for v in l
-                ]
+                'headers': headers
             })
+            for chunk in chunks[:-1]:
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True
+                })
             await send({
                 'type': 'http.response.body',
-                'body': response.body
+                'body': chunks[-1]
             })
 
         else:
@@ -217,6 +332,21 @@ class Application:
 
 
 class Request:
+    __slots__ = (
+        'method',
+        'path',
+        'ip',
+        '_params',
+        'query_string',
+        '_args',
+        'headers',
+        '_cookies',
+        'body',
+        'json',
+        'form',
+        'state'
+    )
+
     def __init__(
         self,
         method,
@@ -224,6 +354,7 @@ class Request:
         *,
         ip='',
         params=None,
+        query_string=b'',
         args=None,
         headers=None,
         cookies=None,
@@ -236,9 +367,10 @@ class Request:
         self.path = path
         self.ip = ip
         self.params = params or {}
-        self.args = MultiDict(args)
+        self.query_string = query_string
+        self._args = None if args is None else MultiDict(args)
         self.headers = MultiDict(headers)
-        self.cookies = SimpleCookie(cookies)
+        self._cookies = None if cookies is None else SimpleCookie(cookies)
         self.body = body
         self.json = json
         self.form = MultiDict(form)
@@ -247,6 +379,47 @@ class Request:
     def __repr__(self):
         return f'{self.method} {self.path}'
 
+    @property
+    def params(self):
+        if not isinstance(self._params, dict):
+            self._params = dict(self._params)
+        return self._params
+
+    @params.setter
+    def params(self, value):
+        self._params = value
+
+    @property
+    def args(self):
+        if self._args is None:
+            self._args = MultiDict(
+                parse_qsl(self.query_string.decode(errors='replace'))
+            )
+        return self._args
+
+    @args.setter
+    def args(self, value):
+        self._args = value
+
+    @property
+    def cookies(self):
+        if self._cookies is None:
+            cookies = SimpleCookie()
+            try:
+                cookies.load(self.headers.get('cookie', ''))
+            except CookieError:
+                raise Response(400)
+            self._cookies = cookies
+        return self._cookies
+
+    @cookies.setter
+    def cookies(self, value):
+        self._cookies = value
+
+    @property
+    def text(self):
+        return self.body.decode()
+
 
 class Response(Exception):
     def __init__(
@@ -257,52 +430,144 @@ class Response(Exception):
         cookies=None,
         body=b''
     ):
+        super().__init__(status)
         self.status = status
-        try:
-            self.description = HTTPStatus(status).phrase
-        except ValueError:
-            self.description = ''
-        super().__init__(f'{self.status} {self.description}')
+        self.description = STATUS_PHRASES.get(status, '')
         self.headers = MultiDict(headers)
         self.headers.setdefault('content-type', 'text/html; charset=utf-8')
-        self.cookies = SimpleCookie(cookies)
+        self._cookies = None if cookies is None else SimpleCookie(cookies)
         self.body = body
 
+    def __str__(self):
+        return f'{self.status} {self.description}'
+
+    @property
+    def cookies(self):
+        if self._cookies is None:
+            self._cookies = SimpleCookie()
+        return self._cookies
+
+    @cookies.setter
+    def cookies(self, value):
+        self._cookies = value
+
     @classmethod
     def from_any(cls, any):
-        if isinstance(any, int):
-            return cls(status=any, body=HTTPStatus(any).phrase.encode())
+        if isinstance(any, cls):
+            return any
         elif isinstance(any, str):
             return cls(status=200, body=any.encode())
-        elif isinstance(any, bytes):
-            return cls(status=200, body=any)
         elif isinstance(any, dict):
             return cls(
                 status=200,
                 headers={'content-type': 'application/json'},
-                body=json.dumps(any).encode()
+                body=json_dumps(any)
             )
-        elif isinstance(any, cls):
-            return any
         elif any is None:
             return cls(status=204)
+        elif isinstance(any, bytes):
+            return cls(status=200, body=any)
+        elif isinstance(any, int):
+            return cls(status=any, body=STATUS_BODIES.get(any, b''))
         else:
             raise TypeError
 
 
-async def asyncfy(func, /, *args, **kwargs):
-    if iscoroutinefunction(func):
-        return await func(*args, **kwargs)
+def literal_segment(pattern):
+    end = pattern.find('/', 1)
+    if (
+        pattern.startswith('/')
+        and end > 1
+        and '|' not in pattern
+        and pattern[end + 1:end + 2] not in ('?', '*', '+', '{')
+        and not any(c in pattern[1:end] for c in REGEX_SYNTAX)
+    ):
+        return pattern[1:end]
+
+
+def combine_routes(routes):
+    matchers = []
+    pending = []
+    for i, (pattern, methods) in enumerate(routes):
+        marker = f'r{i}'
+        branch, count = GROUP_NAME.subn(
+            lambda m: f'(?P<{marker}_{m[1]}>', pattern.pattern
+        )
+        if (
+            pattern.flags == re.UNICODE
+            and not GLOBAL_FLAGS.match(pattern.pattern)
+            and count == len(pattern.groupindex)
+            and not BACKREFERENCE.search(pattern.pattern)
+        ):
+            pending.append((pattern, methods, marker, branch))
+        else:
+            matchers += combine_pending(pending)
+            pending = []
+            matchers.append((pattern, methods, None))
+    return matchers + combine_pending(pending)
+
+
+def combine_pending(pending):
+    if not pending:
+        return []
+    try:
+        combined = re.compile('|'.join(
+            f'(?P<{marker}>{branch})' for _, _, marker, branch in pending
+        ))
+    except re.error:
+        return [(pattern, methods, None) for pattern, methods, _, _ in pending]
+    return [(combined, None, {
+        marker: (methods, [
+            (f'{marker}_{name}', name) for name in pattern.groupindex
+        ])
+        for pattern, methods, marker, _ in pending
+    })]
+
+
+@lru_cache(maxsize=1024)
+def is_coroutine_function(func):
+    return iscoroutinefunction(func)
+
+
+def asyncfy(func, /, *args, **kwargs):
+    try:
+        coroutine = is_coroutine_function(func)
+    except TypeError:
+        coroutine = iscoroutinefunction(func)
+    if coroutine:
+        return func(*args, **kwargs)
+    elif getattr(func, '_uhttp_nonblocking', False):
+        return call_inline(func, *args, **kwargs)
     else:
-        return await to_thread(func, *args, **kwargs)
+        return to_thread(func, *args, **kwargs)
+
+
+async def call_inline(func, /, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+def nonblocking(func):
+    if iscoroutinefunction(func):
+        return func
+    try:
+        func._uhttp_nonblocking = True
+    except AttributeError:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return func(*args, **kwargs)
+        wrapper._uhttp_nonblocking = True
+        return wrapper
+    return func
 
 
 class MultiDict(dict):
+    __slots__ = ()
+
     def __init__(self, mapping=None):
         if mapping is None:
             super().__init__()
         elif isinstance(mapping, MultiDict):
-            super().__init__({k.lower(): v[:] for k, v in mapping.itemslist()})
+            super().__init__({k: v[:] for k, v in mapping._items()})
         elif isinstance(mapping, dict):
             super().__init__({
                 k.lower(): [v] if not isinstance(v, list) else v[:]
@@ -310,8 +575,9 @@ class MultiDict(dict):
             })
         elif isinstance(mapping, (tuple, list)):
             super().__init__()
+            setdefault = super().setdefault
             for key, value in mapping:
-                self._setdefault(key.lower(), []).append(value)
+                setdefault(key.lower(), []).append(value)
         else:
             raise TypeError('Invalid mapping type')
 
@@ -331,7 +597,7 @@ class MultiDict(dict):
         return super().items()
 
     def items(self):
-        return {k.lower(): v[-1] for k, v in super().items()}.items()
+        return {k: v[-1] for k, v in super().items()}.items()
 
     def _pop(self, key, default=(None,)):
         return super().pop(key.lower(), list(default))
@@ -353,12 +619,14 @@ class MultiDict(dict):
         return super().values()
 
     def values(self):
-        return {k.lower(): v[-1] for k, v in super().items()}.values()
+        return {k: v[-1] for k, v in super().items()}.values()
 
     def _update(self, *args, **kwargs):
         super().update(*args, **kwargs)
 
     def update(self, *args, **kwargs):
-        new = {}
-        new.update(*args, **kwargs)
-        super().update(MultiDict(new))
+        setitem = super().__setitem__
+        for key, value in dict(*args, **kwargs).items():
+            setitem(
+                key.lower(), value[:] if isinstance(value, list) else [value]
+            )